@@ -99,7 +99,12 @@ def main():
             data_fraction=args.data_fraction,
         )
         train_loader = prepare_dataloader(
-            train_dataset, batch_size=args.batch_size, num_workers=args.num_workers
+            train_dataset,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            prefetch_factor=args.prefetch_factor,
+            pin_memory=not args.no_pin_memory,
+            populate_cache=args.populate_cache,
         )
 
     # normal dataloader for when it is available
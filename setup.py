@@ -25,6 +25,7 @@ KW = ["artificial intelligence", "deep learning", "unsupervised learning", "cont
 EXTRA_REQUIREMENTS = {
     "dali": ["nvidia-dali-cuda110"],
     "umap": ["matplotlib", "seaborn", "pandas", "umap-learn"],
+    "turbojpeg": ["PyTurboJPEG"],
 }
 
 
@@ -21,6 +21,8 @@ import os
 from argparse import Namespace
 from contextlib import suppress
 
+from solo.utils.misc import default_num_workers
+
 
 N_CLASSES_PER_DATASET = {
     "cifar10": 10,
@@ -192,6 +194,14 @@ def additional_setup_pretrain(args: Namespace):
                 kwargs["mean"] = args.mean
                 kwargs["std"] = args.std
 
+    # crops are kept as uint8 and normalized by the method once they are on the gpu
+    if getattr(args, "gpu_normalization", False) and not args.dali:
+        if isinstance(args.transform_kwargs, dict):
+            args.transform_kwargs["gpu_normalization"] = True
+        else:
+            for kwargs in args.transform_kwargs:
+                kwargs["gpu_normalization"] = True
+
     # create backbone-specific arguments
     args.backbone_args = {"cifar": args.dataset in ["cifar10", "cifar100"]}
     if "resnet" in args.backbone:
@@ -220,6 +230,11 @@ def additional_setup_pretrain(args: Namespace):
     elif isinstance(args.devices, str):
         args.devices = [int(device) for device in args.devices.split(",") if device]
 
+    # a negative number of workers splits the cpus among the devices. This is resolved here
+    # so that every dataloader (including dali and the validation one) gets the final value
+    if getattr(args, "num_workers", 0) < 0:
+        args.num_workers = default_num_workers(len(args.devices))
+
     # adjust lr according to batch size
     args.lr = args.lr * args.batch_size * len(args.devices) / 256
 
@@ -51,6 +51,7 @@ from solo.utils.knn import WeightedKNNClassifier
 from solo.utils.lars import LARSWrapper
 from solo.utils.metrics import accuracy_at_k, weighted_mean
 from solo.utils.momentum import MomentumUpdater, initialize_momentum_params
+from solo.utils.pretrain_dataloader import MEANS_N_STD
 from torch.optim.lr_scheduler import MultiStepLR
 from torch.utils.data import DataLoader
 from torchvision.models import resnet18, resnet50
@@ -117,6 +118,7 @@ class BaseMethod(pl.LightningModule):
         knn_eval: bool = False,
         knn_k: int = 20,
         no_channel_last: bool = False,
+        gpu_normalization: bool = False,
         **kwargs,
     ):
         """Base model that implements all basic operations for all self-supervised methods.
@@ -162,6 +164,8 @@ class BaseMethod(pl.LightningModule):
             no_channel_last (bool). Disables channel last conversion operation which
                 speeds up training considerably. Defaults to False.
                 https://pytorch.org/tutorials/intermediate/memory_format_tutorial.html#converting-existing-models
+            gpu_normalization (bool). Normalizes uint8 training crops after they are transferred
+                to the device, instead of in the dataloader workers. Defaults to False.
 
         .. note::
             When using distributed data parallel, the batch size and the number of workers are
@@ -210,6 +214,7 @@ class BaseMethod(pl.LightningModule):
         self.knn_eval = knn_eval
         self.knn_k = knn_k
         self.no_channel_last = no_channel_last
+        self.gpu_normalization = gpu_normalization
 
         self._num_training_steps = None
 
@@ -265,6 +270,19 @@ class BaseMethod(pl.LightningModule):
                 "issues when resuming a checkpoint."
             )
 
+        # statistics for normalizing the uint8 crops on device
+        if self.gpu_normalization:
+            dataset = kwargs["dataset"]
+            if dataset in MEANS_N_STD:
+                mean, std = MEANS_N_STD[dataset]
+            else:
+                mean, std = kwargs["mean"], kwargs["std"]
+            mean = torch.tensor(mean, dtype=torch.float32).view(1, -1, 1, 1) * 255
+            std = torch.tensor(std, dtype=torch.float32).view(1, -1, 1, 1) * 255
+            # (x - mean) / std is computed as x * scale + bias to fuse it in a single kernel
+            self.register_buffer("norm_scale", 1 / std, persistent=False)
+            self.register_buffer("norm_bias", -mean / std, persistent=False)
+
         # can provide up to ~20% speed up
         if not no_channel_last:
             self = self.to(memory_format=torch.channels_last)
@@ -309,7 +327,13 @@ class BaseMethod(pl.LightningModule):
         parser.add_argument("--lr", type=float, default=0.3)
         parser.add_argument("--classifier_lr", type=float, default=0.3)
         parser.add_argument("--weight_decay", type=float, default=0.0001)
+        # a negative number of workers splits the cpus among the gpus
         parser.add_argument("--num_workers", type=int, default=4)
+        # number of batches loaded in advance by each worker (non-dali only)
+        parser.add_argument("--prefetch_factor", type=int, default=2)
+        parser.add_argument("--no_pin_memory", action="store_true")
+        # reads ahead the image files into the page cache (non-dali only)
+        parser.add_argument("--populate_cache", action="store_true")
 
         # wandb
         parser.add_argument("--name")
@@ -357,6 +381,9 @@ class BaseMethod(pl.LightningModule):
         # disables channel last optimization
         parser.add_argument("--no_channel_last", action="store_true")
 
+        # normalizes crops on the gpu instead of in the dataloader workers
+        parser.add_argument("--gpu_normalization", action="store_true")
+
         return parent_parser
 
     def set_loaders(self, train_loader: DataLoader = None, val_loader: DataLoader = None) -> None:
@@ -498,6 +525,45 @@ class BaseMethod(pl.LightningModule):
 
         return [optimizer], [scheduler]
 
+    def on_after_batch_transfer(self, batch: Any, dataloader_idx: int) -> Any:
+        """Normalizes uint8 training crops once they are on the device. Crops that are
+        already in floating point (e.g., coming from dali) are left untouched.
+
+        Args:
+            batch (Any): a batch of data in the format of [img_indexes, [X], Y].
+            dataloader_idx (int): index of the dataloader.
+
+        Returns:
+            Any: the batch with normalized crops.
+        """
+
+        if self.gpu_normalization and self.trainer.training:
+            indexes, X, targets = batch
+            X = [X] if isinstance(X, torch.Tensor) else X
+            X = [self.normalize(x) if x.dtype == torch.uint8 else x for x in X]
+            batch = [indexes, X, targets]
+        return batch
+
+    def normalize(self, X: torch.Tensor) -> torch.Tensor:
+        """Normalizes a batch of uint8 images with the dataset statistics.
+
+        Args:
+            X (torch.Tensor): batch of uint8 images.
+
+        Returns:
+            torch.Tensor: batch of normalized images.
+        """
+
+        # with mixed precision the backbone consumes reduced precision inputs anyway,
+        # so the normalized crops are directly materialized with half the size
+        # the trainer may report the precision either as an int or as a string
+        dtype = {"16": torch.float16, "bf16": torch.bfloat16}.get(
+            str(self.trainer.precision), torch.float32
+        )
+        memory_format = torch.preserve_format if self.no_channel_last else torch.channels_last
+        X = X.to(dtype=dtype, memory_format=memory_format)
+        return torch.addcmul(self.norm_bias.to(dtype), X, self.norm_scale.to(dtype))
+
     def forward(self, X) -> Dict:
         """Basic forward method. Children methods should call this function,
         modify the ouputs (without deleting anything) and return it.
@@ -21,7 +21,6 @@ import os
 from pathlib import Path
 from typing import Callable, List, Sequence, Union
 
-import nvidia.dali.fn as fn
 import nvidia.dali.ops as ops
 import nvidia.dali.types as types
 from nvidia.dali.pipeline import Pipeline
@@ -36,10 +35,18 @@ class Mux:
             prob (float): probability value
         """
 
+        self.prob = prob
         self.to_bool = ops.Cast(dtype=types.DALIDataType.BOOL)
         self.rng = ops.random.CoinFlip(probability=prob)
 
     def __call__(self, true_case, false_case):
+        # avoids blending whole images when the outcome is already known,
+        # unused branches are then pruned from the dali graph
+        if self.prob >= 1:
+            return true_case
+        if self.prob <= 0:
+            return false_case
+
         condition = self.to_bool(self.rng())
         neg_condition = condition ^ True
         return condition * true_case + neg_condition * false_case
@@ -55,15 +62,18 @@ class RandomGrayScaleConversion:
                 Defaults to "gpu".
         """
 
-        self.mux = Mux(prob=prob)
-        self.grayscale = ops.ColorSpaceConversion(
-            device=device, image_type=types.RGB, output_type=types.GRAY
-        )
+        self.prob = prob
+        self.coin = ops.random.CoinFlip(probability=prob)
+        # zero saturation leaves only the luma (0.299R + 0.587G + 0.114B) in all channels
+        self.hsv = ops.Hsv(device=device)
 
     def __call__(self, images):
-        out = self.grayscale(images)
-        out = fn.cat(out, out, out, axis=2)
-        return self.mux(true_case=out, false_case=images)
+        if self.prob <= 0:
+            return images
+
+        # converts and replicates the channels in a single pass, without blending
+        saturation = 1.0 - self.coin() if self.prob < 1 else 0.0
+        return self.hsv(images, saturation=saturation)
 
 
 class RandomColorJitter:
@@ -93,7 +103,8 @@ class RandomColorJitter:
 
         assert 0 <= hue <= 0.5
 
-        self.mux = Mux(prob=prob)
+        self.prob = prob
+        self.coin = ops.random.CoinFlip(probability=prob)
 
         self.color = ops.ColorTwist(device=device)
 
@@ -121,14 +132,23 @@ class RandomColorJitter:
             self.hue = ops.random.Uniform(range=[-hue, hue])
 
     def __call__(self, images):
-        out = self.color(
-            images,
-            brightness=self.brightness() if callable(self.brightness) else self.brightness,
-            contrast=self.contrast() if callable(self.contrast) else self.contrast,
-            saturation=self.saturation() if callable(self.saturation) else self.saturation,
-            hue=self.hue() if callable(self.hue) else self.hue,
-        )
-        return self.mux(true_case=out, false_case=images)
+        if self.prob <= 0:
+            return images
+
+        # samples that are not jittered get the identity parameters, so the whole jitter
+        # is a single color twist instead of being blended with the original images
+        apply = self.coin() if self.prob < 1 else None
+
+        params = {}
+        for name, identity in [("brightness", 1), ("contrast", 1), ("saturation", 1), ("hue", 0)]:
+            value = getattr(self, name)
+            if callable(value):
+                value = value()
+                if apply is not None:
+                    value = apply * (value - identity) + identity
+            params[name] = value
+
+        return self.color(images, **params)
 
 
 class RandomGaussianBlur:
@@ -145,31 +165,39 @@ class RandomGaussianBlur:
         self.mux = Mux(prob=prob)
         # gaussian blur
         self.gaussian_blur = ops.GaussianBlur(device=device, window_size=(window_size, window_size))
-        self.sigma = ops.random.Uniform(range=[0, 1])
+        # sampled directly in [0.1, 2.0], as in the non-dali gaussian blur
+        self.sigma = ops.random.Uniform(range=[0.1, 2.0])
 
     def __call__(self, images):
-        sigma = self.sigma() * 1.9 + 0.1
-        out = self.gaussian_blur(images, sigma=sigma)
+        out = self.gaussian_blur(images, sigma=self.sigma())
         return self.mux(true_case=out, false_case=images)
 
 
 class RandomSolarize:
-    def __init__(self, threshold: int = 128, prob: float = 0.0):
+    def __init__(self, threshold: int = 128, prob: float = 0.0, device: str = "gpu"):
         """Applies random solarization with probability.
 
         Args:
             threshold (int, optional): threshold for inversion. Defaults to 128.
             prob (float, optional): probability of solarization. Defaults to 0.0.
+            device (str, optional): device on which the operation will be performed.
+                Defaults to "gpu".
         """
 
         self.mux = Mux(prob=prob)
 
         self.threshold = threshold
 
+        # a single lookup replaces the inversion, the mask and the blending passes
+        self.solarize = ops.LookupTable(
+            device=device,
+            dtype=types.UINT8,
+            keys=list(range(256)),
+            values=[v if v < threshold else 255 - v for v in range(256)],
+        )
+
     def __call__(self, images):
-        inverted_img = 255 - images
-        mask = images >= self.threshold
-        out = mask * inverted_img + (True ^ mask) * images
+        out = self.solarize(images)
         return self.mux(true_case=out, false_case=images)
 
 
@@ -385,7 +413,7 @@ class ImagenetTransform:
         self.random_gaussian_blur = RandomGaussianBlur(prob=gaussian_prob, device=device)
 
         # solarization
-        self.random_solarization = RandomSolarize(prob=solarization_prob)
+        self.random_solarization = RandomSolarize(prob=solarization_prob, device=device)
 
         # normalize and horizontal flip
         self.cmn = ops.CropMirrorNormalize(
@@ -486,7 +514,7 @@ class CustomTransform:
         self.random_gaussian_blur = RandomGaussianBlur(prob=gaussian_prob, device=device)
 
         # solarization
-        self.random_solarization = RandomSolarize(prob=solarization_prob)
+        self.random_solarization = RandomSolarize(prob=solarization_prob, device=device)
 
         # normalize and horizontal flip
         self.cmn = ops.CropMirrorNormalize(
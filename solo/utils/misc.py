@@ -18,8 +18,9 @@
 # DEALINGS IN THE SOFTWARE.
 
 import math
+import os
 import warnings
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import torch
 import torch.distributed as dist
@@ -165,6 +166,23 @@ def trunc_normal_(tensor, mean=0.0, std=1.0, a=-2.0, b=2.0):
     return _no_grad_trunc_normal_(tensor, mean, std, a, b)
 
 
+def default_num_workers(num_processes: Optional[int] = None, max_workers: int = 16) -> int:
+    """Splits the cpus of the node among the training processes running on it.
+
+    Args:
+        num_processes (Optional[int], optional): number of training processes in the node.
+            Defaults to one per available gpu.
+        max_workers (int, optional): maximum number of workers per process. Defaults to 16.
+
+    Returns:
+        int: number of workers per process.
+    """
+
+    if num_processes is None:
+        num_processes = torch.cuda.device_count()
+    return max(1, min((os.cpu_count() or 1) // max(1, num_processes), max_workers))
+
+
 def get_rank():
     if dist.is_available() and dist.is_initialized():
         return dist.get_rank()
@@ -17,18 +17,50 @@
 # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import io
 import os
 import random
+import threading
+from contextlib import suppress
 from pathlib import Path
-from typing import Any, Callable, List, Optional, Sequence, Type, Union
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Type, Union
 
 import torch
 import torchvision
 from PIL import Image, ImageFilter, ImageOps
+from solo.utils.misc import default_num_workers
 from torch.utils.data import DataLoader
 from torch.utils.data.dataset import Dataset
 from torchvision import transforms
 from torchvision.datasets import STL10, ImageFolder
+from torchvision.transforms.functional import hflip, pil_modes_mapping
+
+try:
+    from turbojpeg import TJFLAG_FASTDCT, TJFLAG_FASTUPSAMPLE, TJPF_RGB, TurboJPEG
+
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError):
+    _turbo_jpeg = None
+
+# mean and std used to normalize each of the supported datasets
+MEANS_N_STD = {
+    "cifar10": ((0.4914, 0.4822, 0.4465), (0.2470, 0.2435, 0.2616)),
+    "cifar100": ((0.5071, 0.4865, 0.4409), (0.2673, 0.2564, 0.2762)),
+    "stl10": ((0.4914, 0.4823, 0.4466), (0.247, 0.243, 0.261)),
+    "imagenet100": ((0.485, 0.456, 0.406), (0.228, 0.224, 0.225)),
+    "imagenet": ((0.485, 0.456, 0.406), (0.228, 0.224, 0.225)),
+}
+
+
+class _IndexMixin:
+    """Mixin that prepends the data index to the output of a dataset."""
+
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        data = super().__getitem__(index)
+        # concatenating tuples avoids unpacking the data into a new tuple
+        return (index,) + data if isinstance(data, tuple) else (index, *data)
 
 
 def dataset_with_index(DatasetClass: Type[Dataset]) -> Type[Dataset]:
@@ -41,23 +73,51 @@ def dataset_with_index(DatasetClass: Type[Dataset]) -> Type[Dataset]:
         Type[Dataset]: dataset with index.
     """
 
-    class DatasetWithIndex(DatasetClass):
-        def __getitem__(self, index):
-            data = super().__getitem__(index)
-            return (index, *data)
-
-    return DatasetWithIndex
+    return type(f"{DatasetClass.__name__}WithIndex", (_IndexMixin, DatasetClass), {})
 
 
 class CustomDatasetWithoutLabels(Dataset):
     def __init__(self, root, transform=None):
-        self.root = Path(root)
         self.transform = transform
-        self.images = os.listdir(root)
+        # full paths are computed once so that __getitem__ doesn't need to join them
+        with os.scandir(root) as it:
+            self.images = [entry.path for entry in it if entry.is_file()]
+
+    def load_image(self, path: str) -> Image:
+        """Loads an image as RGB. JPEGs are decoded with libjpeg-turbo when PyTurboJPEG is
+        available, falling back to PIL for other formats or if decoding fails.
+
+        Args:
+            path (str): path to the image.
+
+        Returns:
+            Image: an image in the PIL.Image format.
+        """
+
+        if _turbo_jpeg is not None:
+            with open(path, "rb") as f:
+                buf = f.read()
+            # jpeg files start with the SOI marker
+            if buf[:2] == b"\xff\xd8":
+                with suppress(OSError):
+                    img = _turbo_jpeg.decode(
+                        buf,
+                        pixel_format=TJPF_RGB,
+                        flags=TJFLAG_FASTDCT | TJFLAG_FASTUPSAMPLE,
+                    )
+                    return Image.fromarray(img)
+            img = Image.open(io.BytesIO(buf))
+        else:
+            img = Image.open(path)
+
+        # convert always makes a copy, so only images in other modes
+        # (e.g., grayscale or CMYK) go through it
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return img
 
     def __getitem__(self, index):
-        path = self.root / self.images[index]
-        x = Image.open(path).convert("RGB")
+        x = self.load_image(self.images[index])
         if self.transform is not None:
             x = self.transform(x)
         return x, -1
@@ -67,18 +127,20 @@ class CustomDatasetWithoutLabels(Dataset):
 
 
 class GaussianBlur:
-    def __init__(self, sigma: Sequence[float] = None):
+    def __init__(self, sigma: Sequence[float] = None, prob: float = 1.0):
         """Gaussian blur as a callable object.
 
         Args:
             sigma (Sequence[float]): range to sample the radius of the gaussian blur filter.
                 Defaults to [0.1, 2.0].
+            prob (float, optional): probability of applying the gaussian blur. Defaults to 1.0.
         """
 
         if sigma is None:
             sigma = [0.1, 2.0]
 
         self.sigma = sigma
+        self.prob = prob
 
     def __call__(self, img: Image) -> Image:
         """Applies gaussian blur to an input image.
@@ -90,13 +152,30 @@ class GaussianBlur:
             Image: blurred image.
         """
 
+        if self.prob < 1.0 and random.random() >= self.prob:
+            return img
+
         sigma = random.uniform(self.sigma[0], self.sigma[1])
         img = img.filter(ImageFilter.GaussianBlur(radius=sigma))
         return img
 
 
 class Solarization:
-    """Solarization as a callable object."""
+    def __init__(self, threshold: int = 128, prob: float = 1.0):
+        """Solarization as a callable object.
+
+        The lookup table is built once here instead of on every call (as done by
+        ImageOps.solarize), so each image only goes through a single C-level point operation.
+
+        Args:
+            threshold (int, optional): all pixels above this value are inverted.
+                Defaults to 128.
+            prob (float, optional): probability of applying solarization. Defaults to 1.0.
+        """
+
+        self.threshold = threshold
+        self.prob = prob
+        self.lut = [i if i < threshold else 255 - i for i in range(256)]
 
     def __call__(self, img: Image) -> Image:
         """Applies solarization to an input image.
@@ -108,7 +187,57 @@ class Solarization:
             Image: solarized image.
         """
 
-        return ImageOps.solarize(img)
+        if self.prob < 1.0 and random.random() >= self.prob:
+            return img
+
+        if img.mode not in ("L", "RGB"):
+            return ImageOps.solarize(img, self.threshold)
+        return img.point(self.lut * len(img.getbands()))
+
+
+class RandomResizedCropAndFlip(transforms.RandomResizedCrop):
+    def __init__(self, *args, flip_prob: float = 0.5, **kwargs):
+        """Random resized crop that also flips the crop horizontally with probability.
+
+        For PIL images, cropping and resizing are done in a single resampling pass and the
+        flip is applied to the resized crop, so there is no intermediate cropped copy nor a
+        separate flip transform. Flipping before the color augmentations doesn't change their
+        outcome, as all of them are either pixel-wise or symmetric.
+
+        Args:
+            flip_prob (float, optional): probability of flipping horizontally. Defaults to 0.5.
+            *args, **kwargs: arguments of torchvision's RandomResizedCrop.
+        """
+
+        super().__init__(*args, **kwargs)
+        self.flip_prob = flip_prob
+
+    def forward(self, img: Image) -> Image:
+        """Crops, resizes and maybe flips an input image.
+
+        Args:
+            img (Image): an image in the PIL.Image format.
+
+        Returns:
+            Image: cropped image.
+        """
+
+        if not isinstance(img, Image.Image):
+            img = super().forward(img)
+            return hflip(img) if random.random() < self.flip_prob else img
+
+        i, j, h, w = self.get_params(img, self.scale, self.ratio)
+        img = img.resize(
+            (self.size[1], self.size[0]),
+            pil_modes_mapping[self.interpolation],
+            box=(j, i, j + w, i + h),
+        )
+        if random.random() < self.flip_prob:
+            img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        return img
+
+    def __repr__(self) -> str:
+        return f"{super().__repr__()[:-1]}, flip_prob={self.flip_prob})"
 
 
 class NCropAugmentation:
@@ -123,17 +252,19 @@ class NCropAugmentation:
         self.transform = transform
         self.num_crops = num_crops
 
-    def __call__(self, x: Image) -> List[torch.Tensor]:
+    def __call__(self, x: Image) -> Tuple[torch.Tensor, ...]:
         """Applies transforms n times to generate n crops.
 
         Args:
             x (Image): an image in the PIL.Image format.
 
         Returns:
-            List[torch.Tensor]: an image in the tensor format.
+            Tuple[torch.Tensor, ...]: an image in the tensor format.
         """
 
-        return [self.transform(x) for _ in range(self.num_crops)]
+        if self.num_crops == 1:
+            return (self.transform(x),)
+        return tuple(self.transform(x) for _ in range(self.num_crops))
 
     def __repr__(self) -> str:
         return f"{self.num_crops} x [{self.transform}]"
@@ -154,8 +285,9 @@ class FullTransformPipeline:
         """
 
         out = []
+        out_extend = out.extend
         for transform in self.transforms:
-            out.extend(transform(x))
+            out_extend(transform(x))
         return out
 
     def __repr__(self) -> str:
@@ -168,6 +300,27 @@ class BaseTransform:
     def __call__(self, x: Image) -> torch.Tensor:
         return self.transform(x)
 
+    @staticmethod
+    def to_tensor(
+        mean: Sequence[float], std: Sequence[float], gpu_normalization: bool = False
+    ) -> List[Callable]:
+        """Returns the transformations that convert a PIL image to a tensor.
+
+        Args:
+            mean (Sequence[float]): mean values for normalization.
+            std (Sequence[float]): std values for normalization.
+            gpu_normalization (bool, optional): keeps the image as an uint8 tensor and leaves
+                normalization to the method, once the batch is on the device. This reduces
+                the amount of data copied to the gpu by 4x. Defaults to False.
+
+        Returns:
+            List[Callable]: list of transformations.
+        """
+
+        if gpu_normalization:
+            return [transforms.PILToTensor()]
+        return [transforms.ToTensor(), transforms.Normalize(mean=mean, std=std)]
+
     def __repr__(self) -> str:
         return str(self.transform)
 
@@ -188,6 +341,7 @@ class CifarTransform(BaseTransform):
         min_scale: float = 0.08,
         max_scale: float = 1.0,
         crop_size: int = 32,
+        gpu_normalization: bool = False,
     ):
         """Class that applies Cifar10/Cifar100 transformations.
 
@@ -210,34 +364,30 @@ class CifarTransform(BaseTransform):
             min_scale (float, optional): minimum scale of the crops. Defaults to 0.08.
             max_scale (float, optional): maximum scale of the crops. Defaults to 1.0.
             crop_size (int, optional): size of the crop. Defaults to 32.
+            gpu_normalization (bool, optional): outputs uint8 tensors and leaves normalization
+                to be done on the gpu. Defaults to False.
         """
 
         super().__init__()
 
-        if cifar == "cifar10":
-            mean = (0.4914, 0.4822, 0.4465)
-            std = (0.2470, 0.2435, 0.2616)
-        else:
-            mean = (0.5071, 0.4865, 0.4409)
-            std = (0.2673, 0.2564, 0.2762)
+        mean, std = MEANS_N_STD[cifar]
 
         self.transform = transforms.Compose(
             [
-                transforms.RandomResizedCrop(
+                RandomResizedCropAndFlip(
                     (crop_size, crop_size),
                     scale=(min_scale, max_scale),
                     interpolation=transforms.InterpolationMode.BICUBIC,
+                    flip_prob=horizontal_flip_prob,
                 ),
                 transforms.RandomApply(
                     [transforms.ColorJitter(brightness, contrast, saturation, hue)],
                     p=color_jitter_prob,
                 ),
                 transforms.RandomGrayscale(p=gray_scale_prob),
-                transforms.RandomApply([GaussianBlur()], p=gaussian_prob),
-                transforms.RandomApply([Solarization()], p=solarization_prob),
-                transforms.RandomHorizontalFlip(p=horizontal_flip_prob),
-                transforms.ToTensor(),
-                transforms.Normalize(mean, std),
+                GaussianBlur(prob=gaussian_prob),
+                Solarization(prob=solarization_prob),
+                *self.to_tensor(mean, std, gpu_normalization),
             ]
         )
 
@@ -257,6 +407,7 @@ class STLTransform(BaseTransform):
         min_scale: float = 0.08,
         max_scale: float = 1.0,
         crop_size: int = 96,
+        gpu_normalization: bool = False,
     ):
         """Class that applies STL10 transformations.
 
@@ -278,26 +429,27 @@ class STLTransform(BaseTransform):
             min_scale (float, optional): minimum scale of the crops. Defaults to 0.08.
             max_scale (float, optional): maximum scale of the crops. Defaults to 1.0.
             crop_size (int, optional): size of the crop. Defaults to 96.
+            gpu_normalization (bool, optional): outputs uint8 tensors and leaves normalization
+                to be done on the gpu. Defaults to False.
         """
 
         super().__init__()
         self.transform = transforms.Compose(
             [
-                transforms.RandomResizedCrop(
+                RandomResizedCropAndFlip(
                     (crop_size, crop_size),
                     scale=(min_scale, max_scale),
                     interpolation=transforms.InterpolationMode.BICUBIC,
+                    flip_prob=horizontal_flip_prob,
                 ),
                 transforms.RandomApply(
                     [transforms.ColorJitter(brightness, contrast, saturation, hue)],
                     p=color_jitter_prob,
                 ),
                 transforms.RandomGrayscale(p=gray_scale_prob),
-                transforms.RandomApply([GaussianBlur()], p=gaussian_prob),
-                transforms.RandomApply([Solarization()], p=solarization_prob),
-                transforms.RandomHorizontalFlip(p=horizontal_flip_prob),
-                transforms.ToTensor(),
-                transforms.Normalize((0.4914, 0.4823, 0.4466), (0.247, 0.243, 0.261)),
+                GaussianBlur(prob=gaussian_prob),
+                Solarization(prob=solarization_prob),
+                *self.to_tensor(*MEANS_N_STD["stl10"], gpu_normalization),
             ]
         )
 
@@ -317,6 +469,7 @@ class ImagenetTransform(BaseTransform):
         min_scale: float = 0.08,
         max_scale: float = 1.0,
         crop_size: int = 224,
+        gpu_normalization: bool = False,
     ):
         """Class that applies Imagenet transformations.
 
@@ -338,25 +491,26 @@ class ImagenetTransform(BaseTransform):
             min_scale (float, optional): minimum scale of the crops. Defaults to 0.08.
             max_scale (float, optional): maximum scale of the crops. Defaults to 1.0.
             crop_size (int, optional): size of the crop. Defaults to 224.
+            gpu_normalization (bool, optional): outputs uint8 tensors and leaves normalization
+                to be done on the gpu. Defaults to False.
         """
 
         self.transform = transforms.Compose(
             [
-                transforms.RandomResizedCrop(
+                RandomResizedCropAndFlip(
                     crop_size,
                     scale=(min_scale, max_scale),
                     interpolation=transforms.InterpolationMode.BICUBIC,
+                    flip_prob=horizontal_flip_prob,
                 ),
                 transforms.RandomApply(
                     [transforms.ColorJitter(brightness, contrast, saturation, hue)],
                     p=color_jitter_prob,
                 ),
                 transforms.RandomGrayscale(p=gray_scale_prob),
-                transforms.RandomApply([GaussianBlur()], p=gaussian_prob),
-                transforms.RandomApply([Solarization()], p=solarization_prob),
-                transforms.RandomHorizontalFlip(p=horizontal_flip_prob),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=(0.485, 0.456, 0.406), std=(0.228, 0.224, 0.225)),
+                GaussianBlur(prob=gaussian_prob),
+                Solarization(prob=solarization_prob),
+                *self.to_tensor(*MEANS_N_STD["imagenet"], gpu_normalization),
             ]
         )
 
@@ -378,6 +532,7 @@ class CustomTransform(BaseTransform):
         crop_size: int = 224,
         mean: Sequence[float] = (0.485, 0.456, 0.406),
         std: Sequence[float] = (0.228, 0.224, 0.225),
+        gpu_normalization: bool = False,
     ):
         """Class that applies Custom transformations.
         If you want to do exoteric augmentations, you can just re-write this class.
@@ -404,26 +559,27 @@ class CustomTransform(BaseTransform):
                 Defaults to (0.485, 0.456, 0.406).
             std (Sequence[float], optional): std values for normalization.
                 Defaults to (0.228, 0.224, 0.225).
+            gpu_normalization (bool, optional): outputs uint8 tensors and leaves normalization
+                to be done on the gpu. Defaults to False.
         """
 
         super().__init__()
         self.transform = transforms.Compose(
             [
-                transforms.RandomResizedCrop(
+                RandomResizedCropAndFlip(
                     crop_size,
                     scale=(min_scale, max_scale),
                     interpolation=transforms.InterpolationMode.BICUBIC,
+                    flip_prob=horizontal_flip_prob,
                 ),
                 transforms.RandomApply(
                     [transforms.ColorJitter(brightness, contrast, saturation, hue)],
                     p=color_jitter_prob,
                 ),
                 transforms.RandomGrayscale(p=gray_scale_prob),
-                transforms.RandomApply([GaussianBlur()], p=gaussian_prob),
-                transforms.RandomApply([Solarization()], p=solarization_prob),
-                transforms.RandomHorizontalFlip(p=horizontal_flip_prob),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=mean, std=std),
+                GaussianBlur(prob=gaussian_prob),
+                Solarization(prob=solarization_prob),
+                *self.to_tensor(mean, std, gpu_normalization),
             ]
         )
 
@@ -552,24 +708,92 @@ def prepare_datasets(
     return train_dataset
 
 
+def populate_page_cache(files: Sequence[str], chunk_size: int = 2**21) -> threading.Thread:
+    """Warms up the page cache by hinting the kernel to read ahead the files in a background
+    thread. If posix_fadvise is not available, the files are read in chunks instead.
+
+    Args:
+        files (Sequence[str]): paths of the files to cache.
+        chunk_size (int, optional): size of the chunks used when reading the files.
+            Defaults to 2 MiB.
+
+    Returns:
+        threading.Thread: the (daemon) thread that is populating the cache.
+    """
+
+    def populate():
+        for file in files:
+            with suppress(OSError):
+                if hasattr(os, "posix_fadvise"):
+                    fd = os.open(file, os.O_RDONLY)
+                    try:
+                        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                    finally:
+                        os.close(fd)
+                else:
+                    with open(file, "rb") as f:
+                        while f.read(chunk_size):
+                            pass
+
+    thread = threading.Thread(target=populate, daemon=True)
+    thread.start()
+    return thread
+
+
 def prepare_dataloader(
-    train_dataset: Dataset, batch_size: int = 64, num_workers: int = 4
+    train_dataset: Dataset,
+    batch_size: int = 64,
+    num_workers: int = -1,
+    prefetch_factor: int = 2,
+    pin_memory: bool = True,
+    populate_cache: bool = False,
+    seed: Optional[int] = None,
 ) -> DataLoader:
     """Prepares the training dataloader for pretraining.
     Args:
         train_dataset (Dataset): the name of the dataset.
         batch_size (int, optional): batch size. Defaults to 64.
-        num_workers (int, optional): number of workers. Defaults to 4.
+        num_workers (int, optional): number of workers. If negative, the cpus of the node are
+            split among its gpus, up to 16 workers per process. Defaults to -1.
+        prefetch_factor (int, optional): number of batches loaded in advance by each worker.
+            Larger values help when the model consumes batches faster than they are loaded.
+            Defaults to 2.
+        pin_memory (bool, optional): copies batches into pinned memory before returning them.
+            Defaults to True.
+        populate_cache (bool, optional): reads ahead the image files into the page cache
+            in a background thread, which reduces stalls during the first epoch. Only
+            has an effect for datasets backed by image files. Defaults to False.
+        seed (Optional[int], optional): seed for the shuffling order. Only takes effect on a
+            single device: under DDP, Lightning replaces the sampler with a DistributedSampler,
+            whose order follows the global seed set by seed_everything. Defaults to None.
     Returns:
         DataLoader: the training dataloader with the desired dataset.
     """
 
+    if num_workers < 0:
+        num_workers = default_num_workers()
+
+    if populate_cache:
+        if isinstance(train_dataset, CustomDatasetWithoutLabels):
+            files = train_dataset.images
+        else:
+            files = [path for path, _ in getattr(train_dataset, "samples", [])]
+        populate_page_cache(files)
+
+    generator = None
+    if seed is not None:
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+
     train_loader = DataLoader(
         train_dataset,
         batch_size=batch_size,
         shuffle=True,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=pin_memory,
         drop_last=True,
+        generator=generator,
+        # prefetching is only supported when using workers
+        **({"prefetch_factor": prefetch_factor} if num_workers > 0 else {}),
     )
     return train_loader
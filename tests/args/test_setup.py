@@ -221,6 +221,7 @@ def test_additional_setup_pretrain():
         "lr": 0.1,
         "batch_size": 128,
         "zero_init_residual": False,
+        "num_workers": -1,
     }
     args = argparse.Namespace(**args)
 
@@ -230,6 +231,7 @@ def test_additional_setup_pretrain():
     assert "momentum" in args.extra_optimizer_args
     assert isinstance(args.devices, list)
     assert "transform_kwargs" in args
+    assert 1 <= args.num_workers <= 16
 
     # symmetric and no multicrop
     args = {
@@ -20,6 +20,7 @@
 import pytest
 import torch
 from solo.methods.base import BaseMethod
+from solo.utils.pretrain_dataloader import MEANS_N_STD
 
 from .utils import DATA_KWARGS, gen_base_kwargs
 
@@ -64,3 +65,77 @@ def test_base():
     model.extra_optimizer_args = {}
     optimizer = model.configure_optimizers()
     assert isinstance(optimizer, torch.optim.Optimizer)
+
+
+class DummyTrainer:
+    def __init__(self, training=True, precision=32):
+        self.training = training
+        self.precision = precision
+
+
+def gen_gpu_normalization_model(dataset="cifar10", **kwargs):
+    BASE_KWARGS = gen_base_kwargs(cifar=False)
+    kwargs = {**BASE_KWARGS, **DATA_KWARGS, "dataset": dataset, **kwargs}
+    model = BaseMethod(**kwargs, gpu_normalization=True)
+    model.trainer = DummyTrainer()
+    return model
+
+
+def test_gpu_normalization():
+    x = torch.randint(0, 256, size=(2, 3, 32, 32), dtype=torch.uint8)
+    custom_stats = ([0.1, 0.2, 0.3], [0.4, 0.5, 0.6])
+
+    for dataset, (mean, std) in [("cifar10", MEANS_N_STD["cifar10"]), ("custom", custom_stats)]:
+        model = gen_gpu_normalization_model(dataset, mean=custom_stats[0], std=custom_stats[1])
+        mean = torch.tensor(mean).view(1, 3, 1, 1)
+        std = torch.tensor(std).view(1, 3, 1, 1)
+
+        out = model.normalize(x)
+        assert out.dtype == torch.float32
+        assert torch.allclose(out, (x.float() / 255 - mean) / std, atol=1e-5)
+
+    # channels last unless disabled
+    model = gen_gpu_normalization_model()
+    assert model.normalize(x).is_contiguous(memory_format=torch.channels_last)
+    model = gen_gpu_normalization_model(no_channel_last=True)
+    assert model.normalize(x).is_contiguous()
+
+    # only uint8 training crops are normalized
+    model = gen_gpu_normalization_model()
+    x_float = torch.rand(2, 3, 32, 32)
+    indexes, targets = torch.arange(2), torch.zeros(2, dtype=torch.long)
+    out_indexes, (x1, x2), out_targets = model.on_after_batch_transfer(
+        [indexes, [x, x_float], targets], 0
+    )
+    assert out_indexes is indexes and out_targets is targets
+    assert x1.dtype == torch.float32
+    assert x2 is x_float
+
+    # validation batches are left untouched
+    model.trainer = DummyTrainer(training=False)
+    batch = (x, targets)
+    assert model.on_after_batch_transfer(batch, 0) is batch
+
+
+def _check_normalization_precision(precisions, device="cpu"):
+    x = torch.randint(0, 256, size=(2, 3, 32, 32), dtype=torch.uint8)
+    mean, std = MEANS_N_STD["cifar10"]
+    expected = (x.float() / 255 - torch.tensor(mean).view(1, 3, 1, 1)) / torch.tensor(std).view(
+        1, 3, 1, 1
+    )
+
+    model = gen_gpu_normalization_model().to(device)
+    for precision, dtype in precisions:
+        model.trainer = DummyTrainer(precision=precision)
+        out = model.normalize(x.to(device))
+        assert out.dtype == dtype
+        assert torch.allclose(out.float().cpu(), expected, atol=5e-2)
+
+
+def test_gpu_normalization_precision():
+    _check_normalization_precision([("bf16", torch.bfloat16), (32, torch.float32)])
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="half precision needs a GPU")
+def test_gpu_normalization_half_precision():
+    _check_normalization_precision([(16, torch.float16), ("16", torch.float16)], device="cuda")
@@ -17,15 +17,24 @@
 # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import os
+import random
+
 import numpy as np
-from PIL import Image
+import torch
+from PIL import Image, ImageOps
+from solo.utils import pretrain_dataloader
 from solo.utils.pretrain_dataloader import (
+    CustomDatasetWithoutLabels,
+    RandomResizedCropAndFlip,
+    Solarization,
+    populate_page_cache,
     prepare_dataloader,
     prepare_datasets,
     prepare_n_crop_transform,
     prepare_transform,
 )
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, TensorDataset
 from torchvision.datasets.cifar import CIFAR10
 
 
@@ -47,6 +56,10 @@ def test_transforms():
     T = prepare_transform("cifar10", crop_size=32, **kwargs)
     assert T(im).size(1) == 32
 
+    T = prepare_transform("cifar10", crop_size=32, gpu_normalization=True, **kwargs)
+    x = T(im)
+    assert x.dtype == torch.uint8 and x.size(1) == 32
+
     T = prepare_transform("stl10", crop_size=96, **kwargs)
     assert T(im).size(1) == 96
 
@@ -79,6 +92,100 @@ def test_transforms():
         assert crop.size(1) == size
 
 
+def test_random_resized_crop_and_flip():
+    im = np.random.rand(100, 80, 3) * 255
+    im = Image.fromarray(im.astype("uint8")).convert("RGB")
+
+    def crop(flip_prob, size=32):
+        random.seed(0)
+        torch.manual_seed(0)
+        return RandomResizedCropAndFlip(size, scale=(0.08, 1.0), flip_prob=flip_prob)(im)
+
+    # same crop, mirrored
+    assert np.array_equal(np.asarray(crop(1.0)), np.asarray(crop(0.0))[:, ::-1])
+
+    # int and tuple sizes
+    assert crop(0.5, size=32).size == (32, 32)
+    assert crop(0.5, size=(24, 40)).size == (40, 24)
+
+    # tensor inputs
+    x = torch.rand(3, 100, 80)
+    T = RandomResizedCropAndFlip((24, 40), scale=(0.08, 1.0), flip_prob=1.0)
+    assert T(x).size() == (3, 24, 40)
+
+    assert repr(T).startswith("RandomResizedCropAndFlip(size=(24, 40)")
+    assert repr(T).endswith(", flip_prob=1.0)")
+
+
+def test_solarization():
+    im = np.random.rand(100, 100, 3) * 255
+    im = Image.fromarray(im.astype("uint8")).convert("RGB")
+
+    for img in [im, im.convert("L")]:
+        out = Solarization()(img)
+        assert out.mode == img.mode
+        assert np.array_equal(np.asarray(out), np.asarray(ImageOps.solarize(img)))
+
+
+def test_custom_dataset_without_labels(tmp_path):
+    im = np.random.rand(50, 50, 3) * 255
+    im = Image.fromarray(im.astype("uint8")).convert("RGB")
+    im.save(tmp_path / "rgb.jpg")
+    im.convert("L").save(tmp_path / "gray.jpg")
+    im.save(tmp_path / "rgb.png")
+    (tmp_path / "folder").mkdir()
+
+    dataset = CustomDatasetWithoutLabels(tmp_path)
+    assert len(dataset) == 3
+    for i in range(len(dataset)):
+        x, y = dataset[i]
+        assert x.mode == "RGB" and x.size == (50, 50)
+        assert y == -1
+
+
+class StubTurboJPEG:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.decoded = []
+
+    def decode(self, buf, pixel_format=None, flags=0):
+        self.decoded.append(buf)
+        if self.fail:
+            raise OSError("unsupported jpeg")
+        return np.full((50, 50, 3), 7, dtype=np.uint8)
+
+
+def test_custom_dataset_without_labels_turbojpeg(tmp_path, monkeypatch):
+    im = np.random.rand(50, 50, 3) * 255
+    im = Image.fromarray(im.astype("uint8")).convert("RGB")
+    im.save(tmp_path / "rgb.jpg")
+    im.convert("L").save(tmp_path / "gray.jpg")
+    im.save(tmp_path / "rgb.png")
+
+    # the flags are only defined when PyTurboJPEG is installed
+    for name in ["TJPF_RGB", "TJFLAG_FASTDCT", "TJFLAG_FASTUPSAMPLE"]:
+        monkeypatch.setattr(pretrain_dataloader, name, 0, raising=False)
+
+    # jpegs go through the decoder, other formats through PIL
+    stub = StubTurboJPEG()
+    monkeypatch.setattr(pretrain_dataloader, "_turbo_jpeg", stub)
+    dataset = CustomDatasetWithoutLabels(tmp_path)
+    for path in dataset.images:
+        x = dataset.load_image(path)
+        assert x.mode == "RGB" and x.size == (50, 50)
+        assert (np.asarray(x) == 7).all() == path.endswith(".jpg")
+    assert len(stub.decoded) == 2
+
+    # jpegs rejected by the decoder fall back to PIL
+    stub = StubTurboJPEG(fail=True)
+    monkeypatch.setattr(pretrain_dataloader, "_turbo_jpeg", stub)
+    for path in dataset.images:
+        x = dataset.load_image(path)
+        assert x.mode == "RGB" and x.size == (50, 50)
+        assert not (np.asarray(x) == 7).all()
+    assert len(stub.decoded) == 2
+
+
 def test_data():
     kwargs = dict(
         brightness=0.5,
@@ -104,3 +211,50 @@ def test_data():
 
     assert isinstance(train_loader, DataLoader)
     assert num_batches_train == len(train_loader)
+
+
+def test_populate_page_cache(tmp_path, monkeypatch):
+    files = []
+    for i in range(3):
+        file = tmp_path / f"{i}.bin"
+        file.write_bytes(bytes(1000))
+        files.append(str(file))
+    inodes = sorted(os.stat(file).st_ino for file in files)
+    # missing files are skipped
+    files.append(str(tmp_path / "missing.bin"))
+
+    # with posix_fadvise, each existing file is advised once
+    advised = []
+    monkeypatch.setattr(
+        os, "posix_fadvise", lambda fd, *args: advised.append(os.fstat(fd).st_ino), raising=False
+    )
+    monkeypatch.setattr(os, "POSIX_FADV_WILLNEED", 3, raising=False)
+    thread = populate_page_cache(files, chunk_size=128)
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert sorted(advised) == inodes
+
+    # without it, each existing file is read instead
+    read = []
+
+    def recording_open(file, *args, **kwargs):
+        f = open(file, *args, **kwargs)
+        read.append(file)
+        return f
+
+    monkeypatch.delattr(os, "posix_fadvise")
+    monkeypatch.setattr(pretrain_dataloader, "open", recording_open, raising=False)
+    thread = populate_page_cache(files, chunk_size=128)
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert read == files[:3]
+
+
+def test_dataloader_seed():
+    dataset = TensorDataset(torch.arange(100))
+
+    first_batches = [
+        next(iter(prepare_dataloader(dataset, batch_size=8, num_workers=0, seed=5)))[0]
+        for _ in range(2)
+    ]
+    assert torch.equal(first_batches[0], first_batches[1])